@@ -1,14 +1,391 @@
-import RPi.GPIO as GPIO
+import ctypes
+from concurrent.futures import ThreadPoolExecutor
+import gpiod
+from gpiod.line import Direction, Value
+import numpy as np
+import os
 import time
 import threading
 
+# Optional import for DMA-timed step pulses via the pigpio daemon
+try:
+    import pigpio
+    PIGPIO_AVAILABLE = True
+except ImportError:
+    PIGPIO_AVAILABLE = False
+
+# Sleeping for less than this is dominated by scheduler wake-up latency,
+# so the remainder of each half-period is spun on perf_counter_ns instead.
+SPIN_THRESHOLD_NS = 200_000
+SPIN_MARGIN_NS = 150_000
+
+# SCHED_FIFO priority of the pulse thread when pinned to a core
+PULSE_THREAD_PRIORITY = 80
+
+# Extra time (s) a software move may take beyond twice its nominal length
+# before the pulse thread is considered stuck
+STEP_TIMEOUT_MARGIN = 1.0
+
+# GPIO character device of the 40-pin header
+GPIO_CHIP = "/dev/gpiochip0"
+
+_LINE_VALUES = (Value.INACTIVE, Value.ACTIVE)
+
+# pigpio wave chain loops repeat at most this many times
+WAVE_CHAIN_MAX_LOOPS = 65535
+
+# clock_nanosleep() constants from <time.h>. On Linux perf_counter_ns()
+# reads CLOCK_MONOTONIC, so its values can be used as absolute deadlines.
+CLOCK_MONOTONIC = 1
+TIMER_ABSTIME = 1
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+try:
+    _clock_nanosleep = ctypes.CDLL(None, use_errno=True).clock_nanosleep
+    _clock_nanosleep.argtypes = [ctypes.c_int, ctypes.c_int,
+                                 ctypes.POINTER(_Timespec), ctypes.POINTER(_Timespec)]
+    _clock_nanosleep.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _clock_nanosleep = None
+
+
+def _ramp_half_periods(steps, start_sps, max_sps, acceleration):
+    """
+    Computes a trapezoidal speed profile for a move of a fixed number of steps.
+
+    The motor accelerates from start_sps at a constant acceleration, cruises
+    at max_sps and decelerates symmetrically so it reaches start_sps again on
+    the last step. Short moves never reach max_sps (triangular profile).
+
+    Returns:
+        numpy.ndarray: The half-period in nanoseconds of every step (int64).
+    """
+    i = np.arange(steps, dtype=np.float64)
+    # Speed after i steps at constant acceleration: v = sqrt(v0^2 + 2*a*i)
+    speed_up = np.sqrt(start_sps * start_sps + 2.0 * acceleration * i)
+    # Mirror it for the deceleration and cap at the cruise speed
+    speed = np.minimum(np.minimum(speed_up, speed_up[::-1]), max_sps)
+    return (500_000_000 / speed).astype(np.int64)
+
+
+def _step_pulses(step_mask, half_periods):
+    """
+    Builds the pigpio pulses of a move: one step pulse per half-period (in nanoseconds).
+    """
+    pulses = []
+    for half_period_ns in half_periods:
+        half_us = max(1, half_period_ns // 1000)
+        pulses.append(pigpio.pulse(step_mask, 0, half_us))
+        pulses.append(pigpio.pulse(0, step_mask, half_us))
+    return pulses
+
+
+class _OutputLines:
+    """
+    A single gpiod line request holding the output pins of every motor.
+    Because all pins share one request, any set of them can be written
+    with one set_values() ioctl.
+    """
+    def __init__(self, chip_path=GPIO_CHIP):
+        self._chip_path = chip_path
+        self._lock = threading.Lock()
+        self._values = {}     # pin -> last written value (0 or 1)
+        self._request = None
+
+    def add(self, initial_values):
+        """
+        Adds output pins to the request.
+
+        Args:
+            initial_values (dict): Maps each pin to its initial value (0 or 1).
+        """
+        with self._lock:
+            self._values.update(initial_values)
+            self._request_lines()
+
+    def remove(self, pins):
+        """
+        Releases the given pins.
+        """
+        with self._lock:
+            for pin in pins:
+                self._values.pop(pin, None)
+            self._request_lines()
+
+    def set_values(self, values):
+        """
+        Writes several pins at once.
+
+        Args:
+            values (dict): Maps pins to their new value (0 or 1).
+        """
+        with self._lock:
+            self._values.update(values)
+            self._request.set_values({pin: _LINE_VALUES[int(v)] for pin, v in values.items()})
+
+    def _request_lines(self):
+        # A request cannot grow, so re-request every line, keeping its value
+        if self._request is not None:
+            self._request.release()
+            self._request = None
+        if self._values:
+            self._request = gpiod.request_lines(
+                self._chip_path,
+                consumer="motor",
+                config={
+                    pin: gpiod.LineSettings(direction=Direction.OUTPUT,
+                                            output_value=_LINE_VALUES[int(v)])
+                    for pin, v in self._values.items()
+                },
+            )
+
+
+class _Channel:
+    """
+    Pulse state of one step pin.
+    """
+    __slots__ = ("half_period_ns", "half_periods", "step_index", "next_edge_ns",
+                 "level", "remaining_edges", "done", "error")
+
+    def __init__(self, half_period_ns, next_edge_ns, remaining_edges, half_periods=None):
+        self.half_period_ns = half_period_ns
+        self.half_periods = half_periods  # Per-step half-periods for a ramped move
+        self.step_index = 0
+        self.next_edge_ns = next_edge_ns
+        self.level = 0
+        self.remaining_edges = remaining_edges  # None to pulse until stopped
+        self.done = threading.Event()
+        self.error = None  # Set if the pulse thread failed before the pin finished
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the pin has stopped pulsing.
+
+        Raises:
+            RuntimeError: If the pulse thread failed while the pin was pulsing.
+            TimeoutError: If the pin is still pulsing after timeout seconds.
+        """
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Step pulses did not finish within {timeout:.1f}s")
+        if self.error is not None:
+            raise RuntimeError("Step pulse thread failed") from self.error
+
+
+class StepScheduler:
+    """
+    A single background thread that generates step pulses for every
+    software-driven motor, instead of one pulse thread per motor.
+
+    Each channel keeps its next edge as an absolute perf_counter_ns deadline.
+    On every wake-up all pins that are due are toggled in one set_values call,
+    so several motors can run at the same time without extra threads.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._channels = {}    # step pin -> _Channel
+        self._thread = None
+        self._pin_cpu = None
+        self._repin = False
+        self._realtime = False # True once the pulse thread runs under SCHED_FIFO
+        self._deadline = _Timespec() # Reused for every absolute-time sleep
+
+    def set_pin_cpu(self, cpu):
+        """
+        Pins the pulse thread to the given CPU core and raises it to SCHED_FIFO.
+        Takes effect on the next wake-up of the pulse thread.
+        """
+        with self._cond:
+            self._pin_cpu = cpu
+            self._repin = True
+            self._cond.notify()
+
+    def start(self, pin, steps_per_second, steps=None, half_periods=None):
+        """
+        Starts pulsing a step pin.
+
+        Args:
+            pin (int): The GPIO pin connected to the PUL+ input of the driver.
+            steps_per_second (int): Pulse rate in steps per second.
+            steps (int, optional): Stop automatically after this many steps.
+            half_periods (list, optional): Half-period in nanoseconds of each step,
+                                           e.g. from _ramp_half_periods(). Overrides
+                                           steps_per_second and steps.
+
+        Returns:
+            _Channel: The pin's pulse state; its wait() blocks until the pin
+                      has stopped pulsing.
+        """
+        if steps_per_second > 0:
+            # half_period = (1 second / steps_per_second) / 2 (for HIGH and LOW)
+            half_period_ns = int(500_000_000 // steps_per_second)
+        else:
+            # If steps_per_second is 0, use a small default delay to avoid division by zero
+            half_period_ns = 1_000_000
+            print("Warning: steps_per_second is 0, using default small delay.")
+
+        if half_periods is not None:
+            steps = len(half_periods)
+        remaining_edges = 2 * steps if steps is not None else None
+        with self._cond:
+            channel = _Channel(half_period_ns, time.perf_counter_ns(), remaining_edges,
+                               half_periods)
+            self._channels[pin] = channel
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True # Set as daemon so it exits when main program exits
+                self._thread.start()
+            self._cond.notify()
+        return channel
+
+    def stop(self, pin):
+        """
+        Stops pulsing a step pin and leaves it LOW.
+        """
+        with self._cond:
+            channel = self._channels.pop(pin, None)
+            if channel is not None:
+                _lines.set_values({pin: 0})
+                channel.done.set()
+                self._cond.notify()
+
+    def _apply_pin_cpu(self):
+        """
+        Applies the CPU affinity and real-time priority to the calling thread,
+        so the pulse loop is not migrated between cores or preempted by other tasks.
+        """
+        self._repin = False
+        self._realtime = False
+        cpu = self._pin_cpu
+        if cpu is None:
+            return
+        # On Linux, pid 0 applies to the calling thread only
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            print(f"Warning: could not pin pulse thread to CPU {cpu}: {e}")
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PULSE_THREAD_PRIORITY))
+            self._realtime = True
+        except OSError as e:
+            print(f"Warning: could not set SCHED_FIFO for pulse thread: {e}")
+
+    def _run(self):
+        """
+        Main loop of the pulse thread.
+        """
+        while True:
+            try:
+                self._pulse_loop()
+            except Exception as e:
+                # Fail the pending moves rather than let the thread die and
+                # leave their callers waiting forever
+                print(f"Error in step pulse thread: {e}")
+                self._fail_channels(e)
+
+    def _pulse_loop(self):
+        """
+        Generates the step pulses until an error is raised.
+        """
+        while True:
+            with self._cond:
+                if self._repin:
+                    self._apply_pin_cpu()
+                if not self._channels:
+                    self._cond.wait()
+                    continue
+
+                target = min(ch.next_edge_ns for ch in self._channels.values())
+                slack = target - time.perf_counter_ns()
+                if slack > SPIN_THRESHOLD_NS:
+                    # Coarse wait; start() and stop() wake us early to reschedule
+                    self._cond.wait((slack - SPIN_MARGIN_NS) / 1e9)
+                    continue
+
+            if self._realtime and _clock_nanosleep is not None:
+                # A spinning SCHED_FIFO thread would starve its core. At real-time
+                # priority an absolute-time sleep wakes close enough to the edge,
+                # and the deadline is integer nanoseconds with no float conversion.
+                self._deadline.tv_sec, self._deadline.tv_nsec = divmod(target, 1_000_000_000)
+                _clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, ctypes.byref(self._deadline), None)
+            else:
+                # Spin the last stretch without holding the lock
+                while time.perf_counter_ns() < target:
+                    pass
+
+            with self._cond:
+                now = time.perf_counter_ns()
+                changes = {}
+                finished = []
+                for pin, ch in list(self._channels.items()):
+                    if ch.next_edge_ns > now:
+                        continue
+                    ch.level ^= 1
+                    changes[pin] = ch.level
+                    if ch.half_periods is not None:
+                        half_period_ns = ch.half_periods[ch.step_index]
+                        if not ch.level:
+                            ch.step_index += 1
+                    else:
+                        half_period_ns = ch.half_period_ns
+                    # Advance from the deadline, not from now, so jitter does not accumulate
+                    ch.next_edge_ns += half_period_ns
+                    if ch.remaining_edges is not None:
+                        ch.remaining_edges -= 1
+                        if ch.remaining_edges <= 0:
+                            del self._channels[pin]
+                            finished.append(ch)
+
+                # One ioctl toggles every due pin
+                if changes:
+                    _lines.set_values(changes)
+                for ch in finished:
+                    ch.done.set()
+
+    def _fail_channels(self, error):
+        """
+        Marks every pulsing pin as failed and wakes whoever waits on it.
+        """
+        with self._cond:
+            for ch in self._channels.values():
+                ch.error = error
+                ch.done.set()
+            self._channels.clear()
+
+
+# Shared by every Motor in the process
+_lines = _OutputLines()
+_scheduler = StepScheduler()
+# pigpio transmits one wave at a time, so motors using waves take turns
+_wave_lock = threading.Lock()
+
 # --- Motor Class Definition ---
 class Motor:
     """
     A class to control a stepper motor connected to a Raspberry Pi
     via a microstep driver.
+
+    Step pulses are generated, in order of preference, by:
+    - the kernel PWM driver (/sys/class/pwm) when a pwm_channel is given,
+    - the Pi's DMA engine from a pigpio wave when pigpiod is reachable,
+    - a software pulse thread, shared by all motors, otherwise.
+    The first two do not depend on the Python interpreter for timing.
     """
-    def __init__(self, dir_pin, step_pin, enable_pin):
+    # Above this rate the step pin is handed to the PWM peripheral instead of
+    # a DMA wave. Only GPIO 12, 13, 18 and 19 can output hardware PWM.
+    HARDWARE_PWM_THRESHOLD = 5000
+    HARDWARE_PWM_PINS = (12, 13, 18, 19)
+
+    # Defaults for run_steps(): the speed the motor can start and stop at
+    # without a ramp, and the acceleration used to reach higher speeds
+    START_STEPS_PER_SECOND = 50
+    DEFAULT_ACCELERATION = 1000  # steps/sec^2
+
+    # sysfs PWM chip exposed by the pwm / pwm-2chan device tree overlays
+    PWM_CHIP_PATH = "/sys/class/pwm/pwmchip0"
+
+    def __init__(self, dir_pin, step_pin, enable_pin, pwm_channel=None, pin_cpu=None):
         """
         Initializes the Motor class with the specified GPIO pins.
 
@@ -17,65 +394,265 @@ class Motor:
             step_pin (int): The GPIO pin connected to the PUL+ (pulse/step) input of the driver.
             enable_pin (int): The GPIO pin connected to the ENA+ (enable) input of the driver.
                               (Set to HIGH to disable, LOW to enable)
+            pwm_channel (int, optional): The sysfs PWM channel routed to step_pin
+                                         (e.g. 0 for GPIO18, 1 for GPIO19 with
+                                         dtoverlay=pwm-2chan). When set, the kernel
+                                         generates the step pulses.
+            pin_cpu (int, optional): CPU core to pin the shared software pulse thread to.
+                                     The thread also switches to SCHED_FIFO (needs root).
+                                     Best used with a core reserved via
+                                     "isolcpus=3 nohz_full=3 rcu_nocbs=3" in /boot/cmdline.txt.
         """
         self.DIR_PIN = dir_pin
         self.STEP_PIN = step_pin
         self.ENABLE_PIN = enable_pin
+        self.pin_cpu = pin_cpu
 
-        # Configure GPIO mode to BCM (Broadcom pin-numbering scheme)
-        GPIO.setmode(GPIO.BCM)
+        # Export the kernel PWM channel if the step pin is driven by sysfs PWM
+        self._pwm_path = None
+        if pwm_channel is not None:
+            self._pwm_path = f"{self.PWM_CHIP_PATH}/pwm{pwm_channel}"
+            if not os.path.exists(self._pwm_path):
+                with open(f"{self.PWM_CHIP_PATH}/export", "w") as f:
+                    f.write(str(pwm_channel))
+                # Give udev a moment to create the channel attributes
+                time.sleep(0.1)
 
-        # Set up GPIO pins as outputs
-        GPIO.setup(self.DIR_PIN, GPIO.OUT)
-        GPIO.setup(self.STEP_PIN, GPIO.OUT)
-        # Set enable pin to HIGH initially to disable the motor driver
-        # This prevents the motor from holding position and drawing current when idle.
-        GPIO.setup(self.ENABLE_PIN, GPIO.OUT, initial=GPIO.HIGH)
+        # Connect to the pigpio daemon if it is available
+        self._pi = None
+        if PIGPIO_AVAILABLE:
+            pi = pigpio.pi()
+            if pi.connected:
+                self._pi = pi
+            else:
+                print("Warning: pigpiod is not running, falling back to software step pulses.")
+
+        if self._pi is not None:
+            # pigpio always uses BCM numbering
+            self._pi.set_mode(self.DIR_PIN, pigpio.OUTPUT)
+            if self._pwm_path is None:
+                self._pi.set_mode(self.STEP_PIN, pigpio.OUTPUT)
+            self._pi.set_mode(self.ENABLE_PIN, pigpio.OUTPUT)
+            # Disable the driver until the motor is started
+            self._pi.write(self.ENABLE_PIN, 1)
+        else:
+            # Set up GPIO pins as outputs (BCM numbering, as line offsets on the chip).
+            # Set enable pin to HIGH initially to disable the motor driver
+            # This prevents the motor from holding position and drawing current when idle.
+            self._gpio_pins = {self.DIR_PIN: 0, self.ENABLE_PIN: 1}
+            # With sysfs PWM the step pin stays in its PWM alternate function
+            if self._pwm_path is None:
+                self._gpio_pins[self.STEP_PIN] = 0
+            _lines.add(self._gpio_pins)
 
-        # Internal flags and thread for motor control
+        if pin_cpu is not None:
+            _scheduler.set_pin_cpu(pin_cpu)
+
+        # Internal flags for motor control
         self._running = False  # Flag to control the motor's running state
-        self._motor_thread = None # Thread object for background motor operation
+        self._wave_ids = []    # pigpio waves currently being transmitted
+        self._hardware_pwm = False # True while the step pin is driven by hardware PWM
+        self._holds_wave_lock = False # True while this motor owns the pigpio wave
         self._steps_per_second = 0 # Desired speed in steps per second
         self._direction = 0    # Current direction (0 or 1)
 
         print(f"Motor initialized: DIR={self.DIR_PIN}, STEP={self.STEP_PIN}, ENABLE={self.ENABLE_PIN}")
 
-    def _motor_loop(self):
+    def _start_software(self):
+        """
+        Starts pulsing the step pin from the shared software scheduler.
+        """
+        # Enable the motor driver (ENABLE_PIN LOW) and set the direction
+        _lines.set_values({self.ENABLE_PIN: 0, self.DIR_PIN: self._direction})
+        _scheduler.start(self.STEP_PIN, self._steps_per_second)
+
+    def _stop_software(self):
+        """
+        Stops the software step pulses and disables the motor driver.
+        """
+        _scheduler.stop(self.STEP_PIN)
+        # Disable the motor driver to save power and prevent heating when stopped.
+        _lines.set_values({self.ENABLE_PIN: 1})
+
+    def _write_pin(self, pin, value):
         """
-        Internal method that runs in a separate thread to continuously pulse the motor.
-        This loop continues as long as the _running flag is True.
+        Sets an output pin through whichever GPIO library is in use.
         """
-        # Enable the motor driver by setting the ENABLE_PIN to LOW
-        GPIO.output(self.ENABLE_PIN, GPIO.LOW)
-        # Set the motor direction
-        GPIO.output(self.DIR_PIN, self._direction)
+        if self._pi is not None:
+            self._pi.write(pin, value)
+        else:
+            _lines.set_values({pin: value})
+
+    def _write_pwm(self, attribute, value):
+        """
+        Writes a value to one of the sysfs PWM channel attributes.
+        """
+        with open(f"{self._pwm_path}/{attribute}", "w") as f:
+            f.write(str(value))
+
+    def _start_pwm(self):
+        """
+        Starts a 50% duty cycle step pulse train on the kernel PWM channel.
+        """
+        # Enable the motor driver and set the direction
+        self._write_pin(self.ENABLE_PIN, 0)
+        self._write_pin(self.DIR_PIN, self._direction)
 
-        # Calculate the delay between pulses based on the desired steps per second.
-        # Each step requires two delays (one for HIGH, one for LOW).
         if self._steps_per_second > 0:
-            # delay = (1 second / steps_per_second) / 2 (for HIGH and LOW)
-            delay = 0.5 / self._steps_per_second
+            period_ns = 1_000_000_000 // self._steps_per_second
         else:
-            # If steps_per_second is 0, use a small default delay to avoid division by zero
-            # and allow the loop to run without immediately exiting if called incorrectly.
-            delay = 0.001
+            period_ns = 2_000_000
             print("Warning: steps_per_second is 0, using default small delay.")
 
-        # Main loop for pulsing the stepper motor
-        while self._running:
-            GPIO.output(self.STEP_PIN, GPIO.HIGH)
-            time.sleep(delay)
-            GPIO.output(self.STEP_PIN, GPIO.LOW)
-            time.sleep(delay)
+        # The duty cycle must never exceed the period, so clear it first
+        self._write_pwm("duty_cycle", 0)
+        self._write_pwm("period", period_ns)
+        self._write_pwm("duty_cycle", period_ns // 2)
+        self._write_pwm("enable", 1)
 
-        # When the _running flag becomes False, the loop exits.
-        # Disable the motor driver to save power and prevent heating when stopped.
-        GPIO.output(self.ENABLE_PIN, GPIO.HIGH)
-        print("Motor thread finished.")
+    def _stop_pwm(self):
+        """
+        Stops the kernel PWM channel and disables the motor driver.
+        """
+        self._write_pwm("enable", 0)
+        self._write_pin(self.ENABLE_PIN, 1)
+
+    def _start_wave(self):
+        """
+        Starts a repeating step pulse train on the pigpio daemon.
+        The pulses are timed by DMA, so no Python code runs per step.
+        pigpio transmits only one wave at a time, so this waits until no
+        other motor is using one.
+        """
+        if (self._steps_per_second >= self.HARDWARE_PWM_THRESHOLD
+                and self.STEP_PIN in self.HARDWARE_PWM_PINS):
+            self._pi.write(self.ENABLE_PIN, 0)
+            self._pi.write(self.DIR_PIN, self._direction)
+            # Frequency in Hz, duty cycle in millionths (500000 = 50%)
+            self._pi.hardware_PWM(self.STEP_PIN, self._steps_per_second, 500000)
+            self._hardware_pwm = True
+            return
+
+        _wave_lock.acquire()
+        self._holds_wave_lock = True
+        # Enable the motor driver and set the direction
+        self._pi.write(self.ENABLE_PIN, 0)
+        self._pi.write(self.DIR_PIN, self._direction)
+
+        if self._steps_per_second > 0:
+            # Half of the step period in microseconds (HIGH and LOW)
+            half_us = int(500000 / self._steps_per_second)
+        else:
+            half_us = 1000
+            print("Warning: steps_per_second is 0, using default small delay.")
+
+        step_mask = 1 << self.STEP_PIN
+        self._pi.wave_add_generic([
+            pigpio.pulse(step_mask, 0, half_us),
+            pigpio.pulse(0, step_mask, half_us),
+        ])
+        wave_id = self._pi.wave_create()
+        self._wave_ids.append(wave_id)
+        self._pi.wave_send_repeat(wave_id)
+
+    def _create_wave(self, half_periods):
+        """
+        Creates a pigpio wave with one step pulse per half-period (in nanoseconds).
+        """
+        self._pi.wave_add_generic(_step_pulses(1 << self.STEP_PIN, half_periods))
+        wave_id = self._pi.wave_create()
+        self._wave_ids.append(wave_id)
+        return wave_id
+
+    def _run_wave_profile(self, half_periods):
+        """
+        Transmits a ramped move as a pigpio wave chain and waits for it to finish.
+        The chain is: ramp up, a cruise block repeated in a loop, ramp down.
+        """
+        _wave_lock.acquire()
+        self._holds_wave_lock = True
+        self._pi.write(self.ENABLE_PIN, 0)
+        self._pi.write(self.DIR_PIN, self._direction)
+
+        fastest = min(half_periods)
+        first = half_periods.index(fastest)
+        last = len(half_periods) - half_periods[::-1].index(fastest)
+        cruise_steps = last - first
+        # Make the cruise block long enough that the loop count fits the chain
+        block = -(-cruise_steps // WAVE_CHAIN_MAX_LOOPS)
+        loops = cruise_steps // block
+        extra = cruise_steps - loops * block
+
+        tail = [fastest] * extra + half_periods[last:]
+        if 2 * (first + block + len(tail)) > self._pi.wave_get_max_pulses():
+            # Every wave of a chain is held in pigpio's pulse memory at once,
+            # and the ramps are too long for it
+            self._stream_waves(half_periods)
+            return
+
+        chain = []
+        if first:
+            chain.append(self._create_wave(half_periods[:first]))
+        chain += [255, 0, self._create_wave([fastest] * block),
+                  255, 1, loops & 0xFF, loops >> 8]
+        if tail:
+            chain.append(self._create_wave(tail))
+        self._pi.wave_chain(chain)
+
+        while self._running and self._pi.wave_tx_busy():
+            time.sleep(0.01)
+
+    def _stream_waves(self, half_periods):
+        """
+        Transmits a move that does not fit in pigpio's pulse memory as a series
+        of waves, each queued to start as soon as the previous one ends.
+        Each wave is padded to half of the memory, so at most two exist at a
+        time and a new wave reuses the space of the one that has finished.
+        """
+        # Stay below half of the pulses so the control blocks fit as well
+        chunk = self._pi.wave_get_max_pulses() // 5  # Steps per wave
+        step_mask = 1 << self.STEP_PIN
+        queued = []
+        for start in range(0, len(half_periods), chunk):
+            if len(queued) == 2:
+                # Wait for the older wave to finish before freeing its space
+                while self._running and self._pi.wave_tx_at() == queued[0]:
+                    time.sleep(0.01)
+                if not self._running:
+                    return
+                wave_id = queued.pop(0)
+                self._pi.wave_delete(wave_id)
+                self._wave_ids.remove(wave_id)
+            self._pi.wave_add_generic(_step_pulses(step_mask, half_periods[start:start + chunk]))
+            wave_id = self._pi.wave_create_and_pad(50)
+            self._wave_ids.append(wave_id)
+            self._pi.wave_send_using_mode(wave_id, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            queued.append(wave_id)
+
+        while self._running and self._pi.wave_tx_busy():
+            time.sleep(0.01)
+
+    def _stop_wave(self):
+        """
+        Stops the pigpio pulse train and disables the motor driver.
+        """
+        if self._hardware_pwm:
+            self._pi.hardware_PWM(self.STEP_PIN, 0, 0)
+            self._hardware_pwm = False
+        else:
+            if self._holds_wave_lock:
+                self._pi.wave_tx_stop()
+                for wave_id in self._wave_ids:
+                    self._pi.wave_delete(wave_id)
+                self._wave_ids = []
+                self._holds_wave_lock = False
+                _wave_lock.release()
+        self._pi.write(self.STEP_PIN, 0)
+        self._pi.write(self.ENABLE_PIN, 1)
 
     def run_motor(self, steps_per_second, direction):
         """
-        Starts the stepper motor rotation in a separate thread.
+        Starts the stepper motor rotation in the background.
 
         Args:
             steps_per_second (int): The desired speed of the motor in steps per second.
@@ -88,10 +665,12 @@ class Motor:
             self._direction = direction
             self._running = True # Set the flag to True to start the motor loop
 
-            # Create and start a new thread to run the _motor_loop function
-            self._motor_thread = threading.Thread(target=self._motor_loop)
-            self._motor_thread.daemon = True # Set as daemon so it exits when main program exits
-            self._motor_thread.start()
+            if self._pwm_path is not None:
+                self._start_pwm()
+            elif self._pi is not None:
+                self._start_wave()
+            else:
+                self._start_software()
             print(f"Motor started: Speed={steps_per_second} steps/sec, Direction={direction}")
         else:
             print("Motor is already running.")
@@ -99,32 +678,168 @@ class Motor:
     def motor_stop(self):
         """
         Stops the stepper motor.
-        This sets the _running flag to False, which signals the motor thread to stop.
-        It then waits for the motor thread to complete its current cycle and terminate.
+        The pulse train is stopped on whichever backend is generating it
+        and the motor driver is disabled.
         """
         if self._running:
             self._running = False # Set the flag to False to stop the motor loop
-            if self._motor_thread:
-                self._motor_thread.join() # Wait for the motor thread to finish
+            if self._pwm_path is not None:
+                self._stop_pwm()
+            elif self._pi is not None:
+                self._stop_wave()
+            else:
+                self._stop_software()
             print("Motor stopped.")
         else:
             print("Motor is not running.")
 
-    def run_for_time(self, steps_per_second, direction, time):
+    def run_for_time(self, steps_per_second, direction, duration):
         """
         Runs the motor for a specified time.
+
+        Args:
+            steps_per_second (int): The desired speed of the motor in steps per second.
+            direction (int): The direction of rotation (0 or 1).
+            duration (float): How long to run the motor, in seconds.
         """
         self.run_motor(steps_per_second, direction)
-        time.sleep(time)
-        self.motor_stop()
+        try:
+            time.sleep(duration)
+        finally:
+            # Never leave the pump running if the wait is interrupted
+            self.motor_stop()
+
+    def run_steps(self, steps, steps_per_second, direction, acceleration=None):
+        """
+        Moves the motor a fixed number of steps with a trapezoidal speed profile,
+        so it can reach speeds it could not start at directly without stalling.
+        Blocks until the move is finished.
+
+        Args:
+            steps (int): The number of steps to move.
+            steps_per_second (int): The cruise speed in steps per second.
+            direction (int): The direction of rotation (0 or 1).
+            acceleration (float, optional): Acceleration in steps/sec^2
+                                            (default DEFAULT_ACCELERATION).
+        """
+        if steps <= 0:
+            return
+        if self._running:
+            print("Motor is already running.")
+            return
+        if acceleration is None:
+            acceleration = self.DEFAULT_ACCELERATION
+
+        start_sps = min(self.START_STEPS_PER_SECOND, steps_per_second)
+        half_periods = _ramp_half_periods(steps, start_sps, steps_per_second, acceleration).tolist()
+
+        self._steps_per_second = steps_per_second
+        self._direction = direction
+        self._running = True
+        print(f"Motor moving {steps} steps: Speed={steps_per_second} steps/sec, Direction={direction}")
+        try:
+            if self._pwm_path is not None:
+                # The kernel PWM cannot count pulses; run at cruise speed for the
+                # equivalent time instead
+                self._start_pwm()
+                time.sleep(steps / steps_per_second)
+            elif self._pi is not None:
+                self._run_wave_profile(half_periods)
+            else:
+                _lines.set_values({self.ENABLE_PIN: 0, self.DIR_PIN: self._direction})
+                # Each step is two half-periods; allow for a loaded system
+                duration = 2 * sum(half_periods) / 1e9
+                _scheduler.start(self.STEP_PIN, steps_per_second, half_periods=half_periods).wait(
+                    2 * duration + STEP_TIMEOUT_MARGIN)
+        finally:
+            self.motor_stop()
 
     def cleanup(self):
         """
         Cleans up all GPIO resources.
         It's crucial to call this when your script exits to release the pins.
         """
-        GPIO.cleanup()
-        print("GPIO cleaned up.")
+        if self._pi is not None:
+            self._pi.write(self.ENABLE_PIN, 1)
+            self._pi.stop()
+            print("pigpio connection closed.")
+        else:
+            _lines.set_values({self.ENABLE_PIN: 1})
+            _lines.remove(self._gpio_pins)
+            print("GPIO cleaned up.")
+
+def run_steps_together(moves, acceleration=None):
+    """
+    Moves several motors at the same time, each a fixed number of steps with
+    its own trapezoidal speed profile. Blocks until every move is finished.
+
+    pigpio transmits only one wave at a time, so when every motor is driven
+    by pigpio waves the step pulses of all the moves are merged into one
+    wave. Otherwise each move runs on its own thread; the software scheduler
+    and kernel PWM drive several motors at once.
+
+    Args:
+        moves (list): (motor, steps, steps_per_second, direction) tuples.
+        acceleration (float, optional): Acceleration in steps/sec^2
+                                        (default Motor.DEFAULT_ACCELERATION).
+    """
+    moves = [move for move in moves if move[1] > 0]
+    if not moves:
+        return
+    if acceleration is None:
+        acceleration = Motor.DEFAULT_ACCELERATION
+
+    if (len(moves) > 1
+            and all(motor._pi is not None and motor._pwm_path is None and not motor._running
+                    for motor, *_ in moves)
+            and 2 * sum(steps for _, steps, _, _ in moves) <= moves[0][0]._pi.wave_get_max_pulses()):
+        _run_merged_wave(moves, acceleration)
+        return
+
+    # Moves too long for one wave still take turns on the wave lock
+    with ThreadPoolExecutor(max_workers=len(moves)) as pool:
+        jobs = [pool.submit(motor.run_steps, steps, steps_per_second, direction, acceleration)
+                for motor, steps, steps_per_second, direction in moves]
+        # Re-raise any motor error here
+        for job in jobs:
+            job.result()
+
+
+def _run_merged_wave(moves, acceleration):
+    """
+    Transmits the moves of several pigpio motors as a single wave and waits for it to finish.
+    """
+    # Every Motor talks to the same daemon, so any connection can send the wave
+    pi = moves[0][0]._pi
+    wave_id = None
+    with _wave_lock:
+        try:
+            # Start from an empty waveform; pulses added below are merged by time
+            pi.wave_add_new()
+            for motor, steps, steps_per_second, direction in moves:
+                start_sps = min(motor.START_STEPS_PER_SECOND, steps_per_second)
+                half_periods = _ramp_half_periods(steps, start_sps, steps_per_second,
+                                                  acceleration).tolist()
+                motor._running = True
+                motor._direction = direction
+                pi.write(motor.ENABLE_PIN, 0)
+                pi.write(motor.DIR_PIN, direction)
+                pi.wave_add_generic(_step_pulses(1 << motor.STEP_PIN, half_periods))
+                print(f"Motor moving {steps} steps: Speed={steps_per_second} steps/sec, Direction={direction}")
+            wave_id = pi.wave_create()
+            pi.wave_send_once(wave_id)
+
+            while pi.wave_tx_busy():
+                time.sleep(0.01)
+        finally:
+            pi.wave_tx_stop()
+            if wave_id is not None:
+                pi.wave_delete(wave_id)
+            for motor, *_ in moves:
+                pi.write(motor.STEP_PIN, 0)
+                pi.write(motor.ENABLE_PIN, 1)
+                motor._running = False
+            print("Motors stopped.")
 
 # --- Main Function ---
 def main():
@@ -1,7 +1,12 @@
+import argparse
+import logging
+import sched
+import sys
 import time
 from read_sensors.read_ph import CalibratedPHReader
 from read_sensors.read_ec import CalibratedECReader
-from actuators.motor import Motor
+from read_sensors.sensor_bundle import SensorBundle
+from actuators.motor import Motor, run_steps_together
 from calibration.reservoir_logger import ReservoirLogger, ReservoirAdjustment
 from typing import Optional
 
@@ -11,9 +16,21 @@ try:
     ULTRASONIC_AVAILABLE = True
 except (ImportError, RuntimeError):
     ULTRASONIC_AVAILABLE = False
-    print("Note: Ultrasonic sensor support not available - will use default volume")
 
-def main():
+# Named so it does not clash with the ReservoirLogger instance in main()
+log = logging.getLogger('reservoir')
+
+def main(once: bool = False) -> int:
+    """
+    Run the reservoir controller.
+
+    Args:
+        once: Run a single check and exit (for use with systemd/balance.timer)
+              instead of staying resident and scheduling checks every hour.
+
+    Returns:
+        Process exit code.
+    """
     # Initialize sensors and motors
     ph_reader = CalibratedPHReader()
     ec_reader = CalibratedECReader()
@@ -30,10 +47,15 @@ def main():
                 tub_width_cm=40.0,   # actual tub
                 sensor_offset_cm=2.0  # Distance sensor is mounted from top
             )
-            print("Ultrasonic sensor initialized successfully")
+            log.info("Ultrasonic sensor initialized successfully")
         except Exception as e:
-            print(f"Failed to initialize ultrasonic sensor: {e}")
+            log.warning("Failed to initialize ultrasonic sensor: %s", e)
             ultra_reader = None
+    else:
+        log.info("Ultrasonic sensor support not available - will use default volume")
+
+    # Read pH, EC and volume together as one snapshot
+    sensors = SensorBundle(ph_reader, ec_reader, ultra_reader)
 
     fertilizer_part_a = Motor(17, 27, 22)
     fertilizer_part_b = Motor(23, 24, 25)
@@ -48,6 +70,22 @@ def main():
     TARGET_EC = 1100
     MIN_VOLUME = 20.0  # Minimum volume in liters to operate
     WARNING_VOLUME = 75.0  # Volume threshold for low water warning
+
+    # Timing (seconds)
+    CHECK_INTERVAL = 3600  # Time between regular checks
+    MIXING_TIME = 300  # Wait after dosing before re-reading
+    LOW_VOLUME_RETRY = 300  # Re-check interval while the water level is too low
+    RETRY_DELAY = 300  # Longest wait after a failed check
+
+    # Dose sizes are expressed in seconds of pump time at DOSE_CALIBRATION_SPS,
+    # which is what the logger's calibration is based on. The same number of
+    # steps is delivered faster at DOSE_SPS using an acceleration ramp.
+    DOSE_CALIBRATION_SPS = 10
+    DOSE_SPS = 500
+
+    def dose_steps(runtime):
+        """Steps delivering the dose equivalent of running a pump for runtime seconds"""
+        return int(round(runtime * DOSE_CALIBRATION_SPS))
     
     def apply_adjustments(recommendations):
         """Apply the recommended motor runtimes and return total runtime for each motor"""
@@ -58,145 +96,189 @@ def main():
             'fert_b': 0.0
         }
         
+        # The pH and fertilizer pumps are independent, so the pH dose and
+        # part A run at the same time (as one pigpio wave when pigpiod is
+        # running); part B waits for part A so they never mix neat
+        moves = []
         # Apply pH adjustments
         if recommendations['ph_up'] > 0:
             runtime = recommendations['ph_up']
-            ph_up.run_for_time(10, 1, runtime)  # 10 steps/sec
+            moves.append((ph_up, dose_steps(runtime), DOSE_SPS, 1))
             runtimes['ph_up'] = runtime
         elif recommendations['ph_down'] > 0:
             runtime = recommendations['ph_down']
-            ph_down.run_for_time(10, 1, runtime)
+            moves.append((ph_down, dose_steps(runtime), DOSE_SPS, 1))
             runtimes['ph_down'] = runtime
-            
+
         # Apply EC adjustments
-        if recommendations['fert_a'] > 0:
-            runtime = recommendations['fert_a']
-            fertilizer_part_a.run_for_time(10, 1, runtime)
-            runtimes['fert_a'] = runtime
+        fert_runtime = recommendations['fert_a']
+        if fert_runtime > 0:
+            moves.append((fertilizer_part_a, dose_steps(fert_runtime), DOSE_SPS, 1))
+            runtimes['fert_a'] = fert_runtime
+            runtimes['fert_b'] = fert_runtime
+
+        run_steps_together(moves)
+
+        if fert_runtime > 0:
             # Wait briefly between part A and B
             time.sleep(2)
-            fertilizer_part_b.run_for_time(10, 1, runtime)
-            runtimes['fert_b'] = runtime
-            
+            fertilizer_part_b.run_steps(dose_steps(fert_runtime), DOSE_SPS, 1)
+
         return runtimes
 
-    print("Starting reservoir management system...")
-    print(f"Target values - pH: {TARGET_PH}, EC: {TARGET_EC}")
+    log.info("Starting reservoir management system, targets ph=%s ec=%s", TARGET_PH, TARGET_EC)
+
+    def check():
+        """
+        Run one read/adjust/log cycle.
+
+        Returns:
+            None when the check completed, otherwise the number of seconds
+            to wait before trying again.
+        """
+        # Read current values (volume is None without an ultrasonic sensor)
+        current_ph, current_ec, current_volume = sensors.snapshot()
+
+        if current_volume is not None:
+            log.info("volume=%.1fL", current_volume)
+            
+            # Check if volume is too low
+            if current_volume < MIN_VOLUME:
+                log.warning("Water level too low (%.1fL < %sL) - please add water to the reservoir",
+                            current_volume, MIN_VOLUME)
+                return LOW_VOLUME_RETRY
+            elif current_volume < WARNING_VOLUME:
+                log.warning("Water level is getting low (%.1fL < %sL) - please fill up the reservoir soon",
+                            current_volume, WARNING_VOLUME)
+            
+        # Update logger's volume (will use default if current_volume is None)
+        logger.volume_liters = current_volume
+        
+        if current_ph is None or current_ec is None:
+            raise RuntimeError("Could not read pH or EC")
+        
+        log.info("readings ph=%.2f ec=%.0f", current_ph, current_ec)
+        
+        # Get recommended adjustments
+        recommendations = logger.get_recommended_runtime(
+            current_ph=current_ph,
+            target_ph=TARGET_PH,
+            current_ec=current_ec,
+            target_ec=TARGET_EC
+        )
+        
+        # If any adjustments are needed
+        if any(v > 0 for v in recommendations.values()):
+            if log.isEnabledFor(logging.INFO):
+                log.info("adjusting %s", ' '.join(f"{motor}={runtime:.1f}s"
+                                                  for motor, runtime in recommendations.items()
+                                                  if runtime > 0))
+            
+            # Apply adjustments and get actual runtimes
+            runtimes = apply_adjustments(recommendations)
+            
+            # Wait for mixing
+            log.info("Waiting %d minutes for mixing", MIXING_TIME // 60)
+            time.sleep(MIXING_TIME)
+            
+            # Read new values
+            new_ph, new_ec, new_volume = sensors.snapshot()
+            
+            if None in (new_ph, new_ec):
+                raise RuntimeError("Could not read sensors after adjustment")
+            
+            if new_volume is not None:
+                log.info("new readings ph=%.2f ec=%.0f volume=%.1fL", new_ph, new_ec, new_volume)
+            else:
+                log.info("new readings ph=%.2f ec=%.0f", new_ph, new_ec)
+            
+            # Log the adjustment
+            adjustment = ReservoirAdjustment(
+                timestamp=time.time(),
+                ph_before=current_ph,
+                ph_after=new_ph,
+                ec_before=current_ec,
+                ec_after=new_ec,
+                ph_up_runtime=runtimes['ph_up'],
+                ph_down_runtime=runtimes['ph_down'],
+                fert_a_runtime=runtimes['fert_a'],
+                fert_b_runtime=runtimes['fert_b'],
+                volume_liters=new_volume if new_volume is not None else logger.DEFAULT_VOLUME
+            )
+            logger.log_adjustment(adjustment)
+            
+            # Log statistics
+            stats = logger.get_statistics()
+            log.info("stats adjustments=%d ph_buffer=%.4f pH/sec ec_response=%.2f EC/sec",
+                     stats['total_adjustments'],
+                     stats['current_ph_buffer_capacity'],
+                     stats['current_ec_response_factor'])
+            if stats['last_24h_adjustments'] > 0:
+                log.info("stats 24h avg_ph_change=%.2f avg_ec_change=%.2f",
+                         stats['average_ph_change'], stats['average_ec_change'])
+        else:
+            log.info("No adjustments needed")
+        return None
+
+    # Checks run on a fixed grid (start + n * CHECK_INTERVAL) so the time
+    # spent dosing and mixing does not push later checks back.
+    scheduler = sched.scheduler(time.monotonic, time.sleep)
+    start_time = time.monotonic()
+    state = {'checks': 0, 'failures': 0}
+
+    def run_check():
+        try:
+            retry_in = check()
+            state['failures'] = 0
+        except Exception:
+            # Retry quickly after a transient error, backing off up to RETRY_DELAY
+            state['failures'] += 1
+            retry_in = min(RETRY_DELAY, 5 * 2 ** state['failures'])
+            log.exception("Error during operation")
+
+        if retry_in is not None:
+            log.info("Waiting %d seconds before retry", retry_in)
+            scheduler.enter(retry_in, 1, run_check)
+            return
+
+        # Skip any slots that were missed while this check was running
+        now = time.monotonic()
+        state['checks'] = max(state['checks'] + 1,
+                              int((now - start_time) // CHECK_INTERVAL) + 1)
+        next_check = start_time + state['checks'] * CHECK_INTERVAL
+        log.info("Waiting %.0f minutes until next check", (next_check - now) / 60)
+        scheduler.enterabs(next_check, 1, run_check)
 
     try:
-        while True:
+        if once:
             try:
-                # Read current volume if sensor available
-                current_volume = None
-                if ultra_reader is not None:
-                    current_volume = ultra_reader.get_water_volume_l()
-                    if current_volume is not None:
-                        print(f"\nCurrent water volume: {current_volume:.1f}L")
-                        
-                        # Check if volume is too low
-                        if current_volume < MIN_VOLUME:
-                            print(f"Warning: Water level too low ({current_volume:.1f}L < {MIN_VOLUME}L)")
-                            print("Please add water to the reservoir.")
-                            time.sleep(300)  # Wait 5 minutes
-                            continue
-                        elif current_volume < WARNING_VOLUME:
-                            print(f"\n⚠️  Warning: Water level is getting low ({current_volume:.1f}L < {WARNING_VOLUME}L)")
-                            print("Please fill up the reservoir soon to maintain optimal operation.")
-                    
-                # Update logger's volume (will use default if current_volume is None)
-                logger.volume_liters = current_volume
-                
-                # Read current values
-                current_ph = ph_reader.read_ph()
-                current_ec = float(ec_reader.read_ec())
-                
-                if current_ph is None or current_ec is None:
-                    print("Error: Could not read pH or EC. Waiting 5 minutes...")
-                    time.sleep(300)
-                    continue
-                
-                print(f"Current readings - pH: {current_ph:.2f}, EC: {current_ec:.0f}")
-                
-                # Get recommended adjustments
-                recommendations = logger.get_recommended_runtime(
-                    current_ph=current_ph,
-                    target_ph=TARGET_PH,
-                    current_ec=current_ec,
-                    target_ec=TARGET_EC
-                )
-                
-                # If any adjustments are needed
-                if any(v > 0 for v in recommendations.values()):
-                    print("\nAdjustments needed:")
-                    for motor, runtime in recommendations.items():
-                        if runtime > 0:
-                            print(f"- {motor}: {runtime:.1f} seconds")
-                    
-                    # Apply adjustments and get actual runtimes
-                    runtimes = apply_adjustments(recommendations)
-                    
-                    # Wait for mixing
-                    print("\nWaiting 5 minutes for mixing...")
-                    time.sleep(300)  # 5 minutes
-                    
-                    # Read new values
-                    new_ph = ph_reader.read_ph()
-                    new_ec = float(ec_reader.read_ec())
-                    new_volume = ultra_reader.get_water_volume_l() if ultra_reader else None
-                    
-                    if None in (new_ph, new_ec):
-                        print("Error: Could not read sensors after adjustment")
-                        time.sleep(300)
-                        continue
-                    
-                    # Print readings
-                    if new_volume is not None:
-                        print(f"New readings - pH: {new_ph:.2f}, EC: {new_ec:.0f}, Volume: {new_volume:.1f}L")
-                    else:
-                        print(f"New readings - pH: {new_ph:.2f}, EC: {new_ec:.0f}")
-                    
-                    # Log the adjustment
-                    adjustment = ReservoirAdjustment(
-                        timestamp=time.time(),
-                        ph_before=current_ph,
-                        ph_after=new_ph,
-                        ec_before=current_ec,
-                        ec_after=new_ec,
-                        ph_up_runtime=runtimes['ph_up'],
-                        ph_down_runtime=runtimes['ph_down'],
-                        fert_a_runtime=runtimes['fert_a'],
-                        fert_b_runtime=runtimes['fert_b'],
-                        volume_liters=new_volume if new_volume is not None else logger.DEFAULT_VOLUME
-                    )
-                    logger.log_adjustment(adjustment)
-                    
-                    # Print statistics
-                    stats = logger.get_statistics()
-                    print("\nSystem Statistics:")
-                    print(f"- Total adjustments: {stats['total_adjustments']}")
-                    print(f"- pH buffer capacity: {stats['current_ph_buffer_capacity']:.4f} pH/sec")
-                    print(f"- EC response factor: {stats['current_ec_response_factor']:.2f} EC/sec")
-                    if stats['last_24h_adjustments'] > 0:
-                        print(f"- Average pH change (24h): {stats['average_ph_change']:.2f}")
-                        print(f"- Average EC change (24h): {stats['average_ec_change']:.2f}")
-                else:
-                    print("No adjustments needed.")
-                
-                # Wait for next check (1 hour)
-                print("\nWaiting 1 hour until next check...")
-                time.sleep(3600)
-                
-            except Exception as e:
-                print(f"Error during operation: {e}")
-                print("Waiting 5 minutes before retry...")
-                time.sleep(300)
+                retry_in = check()
+            except Exception:
+                log.exception("Error during operation")
+                return 1
+            if retry_in is not None:
+                log.info("Check skipped - will retry at the next scheduled run")
+            return 0
+
+        scheduler.enter(0, 1, run_check)
+        scheduler.run()
                 
     except KeyboardInterrupt:
-        print("\nShutting down...")
+        log.info("Shutting down")
     finally:
         # Cleanup
+        sensors.close()
         if ultra_reader is not None:
             ultra_reader.cleanup()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Keep the reservoir pH and EC at their targets")
+    parser.add_argument("--once", action="store_true",
+                        help="run a single check and exit (used by systemd/balance.timer)")
+    args = parser.parse_args()
+    # One handler on stderr, which is unbuffered; under systemd the journal
+    # adds its own timestamps, but they are kept for interactive runs
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s',
+                        handlers=[logging.StreamHandler()])
+    sys.exit(main(once=args.once))
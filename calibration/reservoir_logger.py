@@ -1,12 +1,25 @@
+import atexit
+import bisect
+import collections
 import json
+import mmap
+import operator
+import os
+import struct
 import time
 import datetime
-from dataclasses import dataclass
-from typing import Dict, List, Optional
-import numpy as np
+from dataclasses import dataclass, fields
+from typing import Dict, Iterator, List, Optional
 from pathlib import Path
 
-@dataclass
+# Optional faster parser for migrating legacy JSON history files
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+@dataclass(slots=True, frozen=True)
 class ReservoirAdjustment:
     timestamp: float
     ph_before: float
@@ -19,6 +32,15 @@ class ReservoirAdjustment:
     fert_b_runtime: float
     volume_liters: float = 100.0  # Default to 100L if not specified
 
+# On-disk record, one per adjustment, in ReservoirAdjustment field order:
+# timestamp, pH before/after, EC before/after, the four motor runtimes and
+# the volume. Fixed width (44 bytes) so the log can be appended to and
+# read back without parsing.
+RECORD = struct.Struct('<d ff ff ffff f')
+_FIELDS = tuple(f.name for f in fields(ReservoirAdjustment))
+# Reads every field of an adjustment, in record order, in one call
+_record_values = operator.attrgetter(*_FIELDS)
+
 class ReservoirLogger:
     INITIAL_PH_CHANGE_RATE = 0.1  # Very conservative: 0.001 pH change per second
     INITIAL_EC_CHANGE_RATE = 0.1    # 2 EC points per second
@@ -26,105 +48,356 @@ class ReservoirLogger:
     MAX_ADJUSTMENT_TIME = 10.0      # Maximum time to run motors
     SAFETY_MARGIN = 0.2             # 20% safety margin
     DEFAULT_VOLUME = 100.0          # Default volume in liters
+    STATS_WINDOW = 24 * 3600        # Window for the recent statistics in seconds
+    CALIBRATION_WINDOW = 20         # Number of recent adjustments used for calibration
     
-    def __init__(self, log_file: str = "reservoir_history.json"):
+    def __init__(self, log_file: str = "reservoir_history.bin",
+                 flush_records: int = 1, flush_interval: float = 30.0):
+        """
+        Args:
+            log_file: Path of the binary history log
+            flush_records: Write the log once this many records are pending.
+                           The default syncs every adjustment; raise it when
+                           logging many adjustments per minute.
+            flush_interval: Also write pending records when a new one is
+                            logged this many seconds after the last write
+        """
         self.log_file = Path(log_file)
+        # Only the recent adjustments the calibration and statistics use are
+        # kept in memory; the first _history_offset records stay on disk
         self.adjustments: List[ReservoirAdjustment] = []
+        self._history_offset = 0
+        self._fh = None  # Append handle for the log, opened on first write
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self._pending: List[bytes] = []  # Packed records not yet written
+        self._last_flush = time.monotonic()
+        # Length of the whole records when the log ends in a partial one; the
+        # partial record is cut off on the next append, not when loading
+        self._truncate_to: Optional[int] = None
+        atexit.register(self.close)
         self.load_history()
+        self._rebuild_window()
+        self._rebuild_rate_windows()
         
         # Calibration parameters with conservative initial values
-        self.ph_buffer_capacity = self.INITIAL_PH_CHANGE_RATE
-        self.ec_response_factor = self.INITIAL_EC_CHANGE_RATE
-        self._volume_liters = None  # Make volume optional
+        self._ph_buffer_capacity = self.INITIAL_PH_CHANGE_RATE
+        self._ec_response_factor = self.INITIAL_EC_CHANGE_RATE
+        # Set when an adjustment is logged, cleared on recalculation. Starts set
+        # so the first use calibrates from the history loaded above; with a
+        # systemd timer every check is a new process and never logs first.
+        self._cal_dirty = True
+        self.volume_liters = None  # Make volume optional
+    
+    @property
+    def ph_buffer_capacity(self) -> float:
+        """pH change per second of pH pump runtime, recalculated on first use after logging"""
+        if self._cal_dirty:
+            self.update_calibration()
+        return self._ph_buffer_capacity
+    
+    @ph_buffer_capacity.setter
+    def ph_buffer_capacity(self, value: float):
+        self._ph_buffer_capacity = value
+    
+    @property
+    def ec_response_factor(self) -> float:
+        """EC change per second of fertilizer runtime, recalculated on first use after logging"""
+        if self._cal_dirty:
+            self.update_calibration()
+        return self._ec_response_factor
+    
+    @ec_response_factor.setter
+    def ec_response_factor(self, value: float):
+        self._ec_response_factor = value
     
     @property
     def volume_liters(self) -> float:
         """Get the current volume, returning default if not set"""
-        return self._volume_liters if self._volume_liters is not None else self.DEFAULT_VOLUME
+        return self._volume_liters_resolved
     
     @volume_liters.setter
     def volume_liters(self, value: Optional[float]):
         """Set the current volume, allowing None to use default"""
         self._volume_liters = value if value is not None else None
+        # Resolved once here rather than on every read
+        self._volume_liters_resolved = value if value is not None else self.DEFAULT_VOLUME
+        self._volume_factor = 100.0 / self._volume_liters_resolved
+    
+    @staticmethod
+    def _pack(adj: ReservoirAdjustment) -> bytes:
+        """Encode an adjustment as one fixed-width log record"""
+        return RECORD.pack(*_record_values(adj))
+    
+    @property
+    def total_adjustments(self) -> int:
+        """Number of adjustments in the whole history, including those not loaded"""
+        return self._history_offset + len(self.adjustments)
+    
+    def _tail_start(self, mm: mmap.mmap, count: int) -> int:
+        """Index of the first record the calibration or the 24h statistics need"""
+        cutoff = time.time() - self.STATS_WINDOW
+        start = max(0, count - self.CALIBRATION_WINDOW)
+        # Records are in time order, so walk back only while they are recent
+        while start > 0 and RECORD.unpack_from(mm, (start - 1) * RECORD.size)[0] > cutoff:
+            start -= 1
+        return start
+    
+    @staticmethod
+    def _looks_like_json(path: Path) -> bool:
+        """Whether a history file is in the old JSON format rather than binary records"""
+        if path.suffix == '.json':
+            return True
+        with open(path, 'rb') as f:
+            head = f.read(64).lstrip()
+        return head[:1] in (b'[', b'{')
     
     def load_history(self):
-        """Load historical adjustment data from JSON file"""
+        """Load the recent adjustments from the binary log file"""
+        self._history_offset = 0
+        self._truncate_to = None
+        if self.log_file.exists() and self._looks_like_json(self.log_file):
+            # A JSON history passed as the log file is migrated to a binary
+            # log next to it and never written to
+            legacy_file = self.log_file
+            self.log_file = legacy_file.with_suffix('.bin')
+            if self.log_file == legacy_file:
+                self.log_file = legacy_file.with_suffix('.migrated.bin')
+            if not self.log_file.exists():
+                if self._migrate_legacy_history(legacy_file) or legacy_file.suffix == '.json':
+                    return
+                # Binary records that happen to start like JSON
+                self.log_file = legacy_file
+        else:
+            legacy_file = self.log_file.with_suffix('.json')
+            if not self.log_file.exists() and legacy_file.exists():
+                self._migrate_legacy_history(legacy_file)
+                return
+
         if self.log_file.exists():
             try:
-                with open(self.log_file, 'r') as f:
-                    data = json.load(f)
-                    self.adjustments = [ReservoirAdjustment(**adj) for adj in data]
-                print(f"Loaded {len(self.adjustments)} historical adjustments")
+                with open(self.log_file, 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    usable = size - size % RECORD.size
+                    if usable != size:
+                        # A record that was only partly written is ignored
+                        # here and cut off before the next append, so that
+                        # new records stay aligned
+                        print("Warning: ignoring incomplete record at end of history")
+                        self._truncate_to = usable
+                    self.adjustments = []
+                    if usable:
+                        with mmap.mmap(f.fileno(), usable, access=mmap.ACCESS_READ) as mm:
+                            # Fixed-width records, so the tail can be read
+                            # without touching the rest of the file
+                            start = self._tail_start(mm, usable // RECORD.size)
+                            self.adjustments = [ReservoirAdjustment(*rec)
+                                                for rec in RECORD.iter_unpack(mm[start * RECORD.size:])]
+                            self._history_offset = start
+                print(f"Loaded {len(self.adjustments)} recent of {self.total_adjustments} historical adjustments")
             except Exception as e:
                 print(f"Error loading history: {e}")
                 self.adjustments = []
+                self._history_offset = 0
         else:
             print("No history file found - starting with conservative initial values")
             self.adjustments = []
     
+    def _migrate_legacy_history(self, legacy_file: Path) -> bool:
+        """
+        Convert a history file from the old JSON format to the binary log
+        
+        Returns:
+            True if the file was read as JSON history, False otherwise
+        """
+        try:
+            with open(legacy_file, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+            self.adjustments = [ReservoirAdjustment(**adj) for adj in data]
+        except Exception as e:
+            print(f"Error migrating history: {e}")
+            self.adjustments = []
+            return False
+        self.save_history()
+        print(f"Migrated {len(self.adjustments)} historical adjustments from {legacy_file} to {self.log_file}")
+        return True
+    
     def save_history(self):
-        """Save adjustment history to JSON file"""
+        """Rewrite the whole log file from the adjustments held in memory"""
+        try:
+            self.close()
+            self._pending = []
+            self._truncate_to = None  # The rewrite drops any partial record
+            # Keep the older records that were never loaded
+            older = b''
+            if self._history_offset:
+                with open(self.log_file, 'rb') as f:
+                    older = f.read(self._history_offset * RECORD.size)
+            with open(self.log_file, 'wb') as f:
+                f.write(older + b''.join(self._pack(adj) for adj in self.adjustments))
+        except Exception as e:
+            print(f"Error saving history: {e}")
+    
+    def iter_all(self) -> Iterator[ReservoirAdjustment]:
+        """Yield every adjustment in the history, oldest first, reading the log lazily"""
+        self.flush()
+        if not self.log_file.exists():
+            return
+        with open(self.log_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            size -= size % RECORD.size
+            if not size:
+                return
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                for rec in RECORD.iter_unpack(mm):
+                    yield ReservoirAdjustment(*rec)
+    
+    def _append_record(self, adjustment: ReservoirAdjustment):
+        """Queue one adjustment for the log file, writing it out on a threshold"""
+        self._pending.append(self._pack(adjustment))
+        if (len(self._pending) >= self.flush_records
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """Append all pending records to the log file and sync it to disk"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
         try:
-            with open(self.log_file, 'w') as f:
-                json.dump([vars(adj) for adj in self.adjustments], f, indent=2)
+            if self._fh is None:
+                self._fh = open(self.log_file, 'ab')
+                if self._truncate_to is not None:
+                    # Cut off the partial record found on load; the file has
+                    # been read as records, so it is this log
+                    self._fh.truncate(self._truncate_to)
+                    self._truncate_to = None
+            self._fh.write(b''.join(self._pending))
+            self._fh.flush()
+            os.fdatasync(self._fh.fileno())
+            self._pending = []
         except Exception as e:
             print(f"Error saving history: {e}")
     
+    def close(self):
+        """Write any pending records and close the log file"""
+        self.flush()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+    
+    def _rebuild_window(self):
+        """Collect the adjustments inside the statistics window and their sums"""
+        self._window: collections.deque = collections.deque()  # (timestamp, |pH change|, |EC change|)
+        self._sum_ph_change = 0.0
+        self._sum_ec_change = 0.0
+        for adj in self.adjustments:
+            self._add_to_window(adj)
+        self._expire_window(time.time())
+    
+    def _add_to_window(self, adj: ReservoirAdjustment):
+        """Add an adjustment to the statistics window"""
+        # Store the changes with the timestamp so expiring an entry is a
+        # plain subtraction
+        ph_change = abs(adj.ph_after - adj.ph_before)
+        ec_change = abs(adj.ec_after - adj.ec_before)
+        self._window.append((adj.timestamp, ph_change, ec_change))
+        self._sum_ph_change += ph_change
+        self._sum_ec_change += ec_change
+    
+    def _expire_window(self, now: float):
+        """Drop adjustments that are older than the statistics window"""
+        window = self._window
+        cutoff = now - self.STATS_WINDOW
+        while window and window[0][0] <= cutoff:
+            _, ph_change, ec_change = window.popleft()
+            self._sum_ph_change -= ph_change
+            self._sum_ec_change -= ec_change
+        if not self._window:
+            # Start again from zero so rounding errors do not build up
+            self._sum_ph_change = 0.0
+            self._sum_ec_change = 0.0
+    
+    def _rebuild_rate_windows(self):
+        """Collect the response rates of the most recent adjustments"""
+        # Each window holds one entry per adjustment (None if that motor did
+        # not run), with the non-None rates also kept sorted for the median
+        self._ph_rates = collections.deque(maxlen=self.CALIBRATION_WINDOW)
+        self._ph_rates_sorted: List[float] = []
+        self._ec_rates = collections.deque(maxlen=self.CALIBRATION_WINDOW)
+        self._ec_rates_sorted: List[float] = []
+        for adj in self.adjustments[-self.CALIBRATION_WINDOW:]:
+            self._add_rates(adj)
+    
+    def _add_rates(self, adj: ReservoirAdjustment):
+        """Add the pH and EC change per second of motor runtime of an adjustment"""
+        ph_runtime = adj.ph_up_runtime + adj.ph_down_runtime
+        ph_rate = abs(adj.ph_after - adj.ph_before) / ph_runtime if ph_runtime > 0 else None
+        self._push_rate(self._ph_rates, self._ph_rates_sorted, ph_rate)
+        
+        ec_runtime = adj.fert_a_runtime + adj.fert_b_runtime
+        ec_rate = (adj.ec_after - adj.ec_before) / ec_runtime if ec_runtime > 0 else None
+        self._push_rate(self._ec_rates, self._ec_rates_sorted, ec_rate)
+    
+    @staticmethod
+    def _push_rate(window: collections.deque, ordered: List[float], rate: Optional[float]):
+        """Append a rate to a window, dropping the oldest one from the sorted copy"""
+        if len(window) == window.maxlen and window[0] is not None:
+            del ordered[bisect.bisect_left(ordered, window[0])]
+        window.append(rate)
+        if rate is not None:
+            bisect.insort(ordered, rate)
+    
+    @staticmethod
+    def _median(ordered: List[float]) -> float:
+        """Median of an already sorted list"""
+        mid = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[mid]
+        return (ordered[mid - 1] + ordered[mid]) / 2
+    
     def log_adjustment(self, adjustment: ReservoirAdjustment):
         """Log a new adjustment and update calibration"""
         self.adjustments.append(adjustment)
-        self.save_history()
-        self.update_calibration()
+        self._append_record(adjustment)
+        self._add_to_window(adjustment)
+        self._expire_window(adjustment.timestamp)
+        self._add_rates(adjustment)
+        # Recalculate when the calibration is next needed rather than here,
+        # so logging stays cheap
+        self._cal_dirty = True
     
     def calculate_ph_buffer_capacity(self) -> float:
         """Calculate pH buffer capacity based on historical data"""
-        if len(self.adjustments) < 5:
+        if self.total_adjustments < 5:
             return self.INITIAL_PH_CHANGE_RATE
         
-        recent_adjustments = self.adjustments[-20:]  # Use last 20 adjustments
-        
-        # Calculate pH change per second of motor runtime
-        ph_changes = []
-        for adj in recent_adjustments:
-            total_runtime = adj.ph_up_runtime + adj.ph_down_runtime
-            if total_runtime > 0:
-                ph_change = abs(adj.ph_after - adj.ph_before)
-                change_per_second = ph_change / total_runtime
-                ph_changes.append(change_per_second)
-        
-        if not ph_changes:
+        # pH change per second of motor runtime over the last 20 adjustments
+        if not self._ph_rates_sorted:
             return self.INITIAL_PH_CHANGE_RATE
         
         # Use median to avoid outliers, but ensure it's not too aggressive
-        calculated_rate = np.median(ph_changes)
+        calculated_rate = self._median(self._ph_rates_sorted)
         return min(calculated_rate, self.INITIAL_PH_CHANGE_RATE * 10)
     
     def calculate_ec_response(self) -> float:
         """Calculate EC response factor based on historical data"""
-        if len(self.adjustments) < 5:
+        if self.total_adjustments < 5:
             return self.INITIAL_EC_CHANGE_RATE
         
-        recent_adjustments = self.adjustments[-20:]
-        
-        # Calculate EC change per second of fertilizer runtime
-        ec_changes = []
-        for adj in recent_adjustments:
-            total_runtime = adj.fert_a_runtime + adj.fert_b_runtime
-            if total_runtime > 0:
-                ec_change = adj.ec_after - adj.ec_before
-                change_per_second = ec_change / total_runtime
-                ec_changes.append(change_per_second)
-        
-        if not ec_changes:
+        # EC change per second of fertilizer runtime over the last 20 adjustments
+        if not self._ec_rates_sorted:
             return self.INITIAL_EC_CHANGE_RATE
         
-        calculated_rate = np.median(ec_changes)
+        calculated_rate = self._median(self._ec_rates_sorted)
         return min(calculated_rate, self.INITIAL_EC_CHANGE_RATE * 5)
     
     def update_calibration(self):
         """Update calibration factors based on historical data"""
-        self.ph_buffer_capacity = self.calculate_ph_buffer_capacity()
-        self.ec_response_factor = self.calculate_ec_response()
+        self._cal_dirty = False
+        self._ph_buffer_capacity = self.calculate_ph_buffer_capacity()
+        self._ec_response_factor = self.calculate_ec_response()
     
     def get_recommended_runtime(self, 
                               current_ph: float, 
@@ -148,57 +421,38 @@ class ReservoirLogger:
         ph_diff = target_ph - current_ph
         if abs(ph_diff) > 0.1:  # Only adjust if difference is significant
             # For pH, start very conservatively if no history
-            if len(self.adjustments) < 5:
+            if self.total_adjustments < 5:
                 print("Warning: No historical data - using very conservative pH adjustment")
                 # Limit initial pH adjustments to small steps
                 ph_diff = max(min(ph_diff, 0.2), -0.2)
             
             # Consider buffer capacity and volume
-            volume_factor = 100 / self.volume_liters
-            required_time = abs(ph_diff) / (self.ph_buffer_capacity * volume_factor)
-            
-            # Apply safety margin
-            required_time *= self.SAFETY_MARGIN
-            
-            # Enforce minimum and maximum runtime
-            required_time = max(self.MIN_ADJUSTMENT_TIME, 
-                              min(required_time, self.MAX_ADJUSTMENT_TIME))
-            
-            if ph_diff > 0:
-                recommendations['ph_up'] = required_time
-            else:
-                recommendations['ph_down'] = required_time
+            required_time = self._runtime_for(ph_diff, self.ph_buffer_capacity)
+            recommendations['ph_up' if ph_diff > 0 else 'ph_down'] = required_time
         
-        # EC adjustment
+        # EC adjustment - fertilizer can only raise EC, so a high EC is left alone
         ec_diff = target_ec - current_ec
-        if abs(ec_diff) > 50:  # Only adjust if difference is significant
+        if ec_diff > 50:  # Only adjust if difference is significant
             # For EC, also be conservative without history
-            if len(self.adjustments) < 5:
+            if self.total_adjustments < 5:
                 print("Warning: No historical data - using conservative EC adjustment")
                 # Limit initial EC adjustments
-                ec_diff = max(min(ec_diff, 200), -200)
-            
-            # Consider response factor and volume
-            volume_factor = 100 / self.volume_liters
-            required_time = abs(ec_diff) / (self.ec_response_factor * volume_factor)
-            
-            # Apply safety margin
-            required_time *= self.SAFETY_MARGIN
+                ec_diff = min(ec_diff, 200)
             
-            # Enforce minimum and maximum runtime
-            required_time = max(self.MIN_ADJUSTMENT_TIME, 
-                              min(required_time, self.MAX_ADJUSTMENT_TIME))
-            
-            if ec_diff > 0:
-                # Split between part A and B
-                recommendations['fert_a'] = required_time / 2
-                recommendations['fert_b'] = required_time / 2
+            # Consider response factor and volume, then split between part A and B
+            required_time = self._runtime_for(ec_diff, self.ec_response_factor)
+            recommendations['fert_a'] = recommendations['fert_b'] = required_time / 2
         
         return recommendations
     
+    def _runtime_for(self, change: float, rate: float) -> float:
+        """Motor runtime for a change at the given response rate, with the safety margin and limits applied"""
+        required_time = abs(change) * self.SAFETY_MARGIN / (rate * self._volume_factor)
+        return max(self.MIN_ADJUSTMENT_TIME, min(required_time, self.MAX_ADJUSTMENT_TIME))
+    
     def get_statistics(self) -> Dict:
         """Get statistical information about adjustments"""
-        if not self.adjustments:
+        if not self.total_adjustments:
             return {
                 'total_adjustments': 0,
                 'current_ph_buffer_capacity': self.INITIAL_PH_CHANGE_RATE,
@@ -206,29 +460,25 @@ class ReservoirLogger:
                 'average_ph_change': 0.0,
                 'average_ec_change': 0.0,
                 'last_24h_adjustments': 0,
-                'data_confidence': 'low' if len(self.adjustments) < 5 else 'medium' if len(self.adjustments) < 20 else 'high'
+                'data_confidence': 'low' if self.total_adjustments < 5 else 'medium' if self.total_adjustments < 20 else 'high'
             }
         
         stats = {
-            'total_adjustments': len(self.adjustments),
+            'total_adjustments': self.total_adjustments,
             'current_ph_buffer_capacity': self.ph_buffer_capacity,
             'current_ec_response_factor': self.ec_response_factor,
             'average_ph_change': 0.0,
             'average_ec_change': 0.0,
             'last_24h_adjustments': 0,
-            'data_confidence': 'low' if len(self.adjustments) < 5 else 'medium' if len(self.adjustments) < 20 else 'high'
+            'data_confidence': 'low' if self.total_adjustments < 5 else 'medium' if self.total_adjustments < 20 else 'high'
         }
         
-        # Calculate 24h statistics
-        now = time.time()
-        last_24h = [adj for adj in self.adjustments 
-                   if now - adj.timestamp < 24 * 3600]
-        
-        if last_24h:
-            stats['last_24h_adjustments'] = len(last_24h)
-            stats['average_ph_change'] = np.mean([abs(adj.ph_after - adj.ph_before) 
-                                                for adj in last_24h])
-            stats['average_ec_change'] = np.mean([abs(adj.ec_after - adj.ec_before) 
-                                                for adj in last_24h])
+        # Calculate 24h statistics from the running window sums
+        self._expire_window(time.time())
+        count = len(self._window)
+        if count:
+            stats['last_24h_adjustments'] = count
+            stats['average_ph_change'] = self._sum_ph_change / count
+            stats['average_ec_change'] = self._sum_ec_change / count
         
         return stats 
\ No newline at end of file
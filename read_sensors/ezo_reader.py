@@ -0,0 +1,106 @@
+import atexit
+import logging
+import re
+import serial
+import time
+from typing import Optional
+
+# Longest wait in seconds between attempts to reopen a port that failed
+MAX_RECONNECT_DELAY = 60
+
+# Longest wait in seconds for a reply (an EZO "R" takes up to about 1s)
+REPLY_TIMEOUT = 1.5
+
+# First number in a reply, e.g. "1234,..." or "7.01" followed by padding
+_NUM_RE = re.compile(rb"[-+]?\d+(?:\.\d+)?")
+
+log = logging.getLogger(__name__)
+
+class EZOSerialReader:
+    """
+    Serial connection to an Atlas Scientific EZO circuit (pH, EC, ORP).
+
+    The port is opened on first use and kept open between readings;
+    reopening it per reading costs a tty reconfigure and DTR toggle.
+    After a serial error the handle is dropped and reopened on the next
+    reading, backing off while the port cannot be opened.
+    """
+    # Encoded once; "R" is sent for every reading
+    _CMD_READ = b"R\r"
+
+    def __init__(self, serial_port, baud_rate=9600, name="sensor"):
+        """
+        Args:
+            serial_port: Device path of the USB serial adapter
+            baud_rate: Baud rate of the EZO circuit
+            name: Sensor name used in error messages
+        """
+        self.serial_port = serial_port
+        self.baud_rate = baud_rate
+        self.name = name
+        self._ser = None
+        self._reconnect_delay = 1
+        self._reconnect_at = 0.0
+        atexit.register(self.close)
+
+    def _get_serial(self):
+        if self._ser is None:
+            now = time.monotonic()
+            if now < self._reconnect_at:
+                raise serial.SerialException(
+                    f"{self.serial_port} unavailable, retrying in {self._reconnect_at - now:.0f}s")
+            try:
+                self._ser = serial.Serial(self.serial_port, self.baud_rate, timeout=REPLY_TIMEOUT)
+            except serial.SerialException:
+                # Back off so an unplugged probe is not reopened on every reading
+                self._reconnect_at = now + self._reconnect_delay
+                self._reconnect_delay = min(self._reconnect_delay * 2, MAX_RECONNECT_DELAY)
+                raise
+            self._reconnect_delay = 1
+        return self._ser
+
+    def close(self):
+        if self._ser is not None:
+            self._ser.close()
+            self._ser = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def read_reply(self) -> Optional[bytes]:
+        """
+        Take one reading.
+
+        Returns:
+            The raw reply bytes, or None if the sensor could not be read.
+        """
+        try:
+            ser = self._get_serial()
+            # Discard anything left over from an earlier, timed out reading
+            ser.reset_input_buffer()
+            ser.write(self._CMD_READ)
+            return ser.read_until(b'\r', 64)
+
+        except Exception as e:
+            log.warning("Error reading %s: %s", self.name, e)
+            if isinstance(e, (serial.SerialException, OSError)):
+                # Drop the handle so the next reading reopens the port
+                self.close()
+            return None
+
+    def read_value(self) -> Optional[float]:
+        """
+        Take one reading and parse its first number.
+
+        Returns:
+            The value, or None if the sensor could not be read or the
+            reply held no number (e.g. "*ER").
+        """
+        reply = self.read_reply()
+        if reply is None:
+            return None
+        match = _NUM_RE.search(reply)
+        return float(match.group()) if match else None
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import re
 import smbus2
 import time
 from typing import Tuple, Optional
@@ -21,6 +22,20 @@ class AtlasColorSensor:
     
     # Atlas Scientific RGB Color sensor default I2C address
     DEFAULT_ADDRESS = 0x70
+    # Bytes read per reply: the status byte, the null-terminated text and
+    # padding. With RGB, LUX and CIE enabled a reply such as
+    # "255,255,255,Lux,65535,xyY,0.333,0.333,65535" is over 40 characters,
+    # more than one 32-byte SMBus block read can return.
+    MAX_RESPONSE_LENGTH = 64
+    # First byte of a reply once the command has completed, or while the
+    # sensor is still processing it
+    STATUS_SUCCESS = 1
+    STATUS_PENDING = 254
+    # Interval between status polls while a command is processing
+    POLL_INTERVAL = 0.05
+    # Parameters included in every "R" reply, in the order the sensor sends them
+    OUTPUTS = ("RGB", "LUX", "CIE")
+    _NUMBER = re.compile(rb"[-+]?\d+(?:\.\d+)?")
     
     def __init__(self, address=0x70, bus=1):
         """Initialize the color sensor.
@@ -31,52 +46,74 @@ class AtlasColorSensor:
         """
         self.address = address
         self.bus = smbus2.SMBus(bus)
+        # Enable every output so one "R" returns all of them
+        for output in self.OUTPUTS:
+            self._send_command(f"O,{output},1")
 
-    def _send_command(self, cmd):
+    def _send_command(self, cmd, timeout=1.5):
         try:
             self.bus.write_i2c_block_data(self.address, ord(cmd[0]), [ord(c) for c in cmd[1:]])
-            time.sleep(0.9)  # Wait for processing
             
-            response_length = self.bus.read_byte(self.address)
-            response = self.bus.read_i2c_block_data(self.address, 0x00, response_length)
-            return bytes(response).decode().strip()
+            # Poll until the sensor has finished processing instead of
+            # always waiting for the slowest command
+            deadline = time.monotonic() + timeout
+            while True:
+                time.sleep(self.POLL_INTERVAL)
+                # One fixed-size raw read: a status byte followed by the
+                # null-terminated reply
+                msg = smbus2.i2c_msg.read(self.address, self.MAX_RESPONSE_LENGTH)
+                self.bus.i2c_rdwr(msg)
+                data = bytes(msg)
+                if data[0] != self.STATUS_PENDING or time.monotonic() >= deadline:
+                    break
+            if data[0] != self.STATUS_SUCCESS:
+                return None
+            # A reply with no terminator was cut off by the read length
+            end = data.find(b'\x00', 1)
+            if end < 0:
+                return None
+            # Replies are ASCII; float() and int() parse the bytes directly
+            return data[1:end].strip()
         except:
             return None
             
-    def read_rgb(self):
-        """Returns (red, green, blue) values"""
+    def read_all(self):
+        """Returns ((red, green, blue), (x, y, Y), lux) from a single reading"""
         response = self._send_command("R")
         if response:
-            return tuple(map(int, response.split(",")))
+            # Labels such as "Lux" or "xyY" may precede fields, so take the numbers in order
+            values = self._NUMBER.findall(response)
+            if len(values) >= 7:
+                rgb = tuple(int(float(v)) for v in values[0:3])
+                lux = float(values[3])
+                cie = tuple(float(v) for v in values[4:7])
+                return rgb, cie, lux
         return None
         
+    def read_rgb(self):
+        """Returns (red, green, blue) values"""
+        reading = self.read_all()
+        return reading[0] if reading else None
+        
     def read_cie(self):
         """Returns (x, y, Y) CIE values"""
-        response = self._send_command("C")
-        if response:
-            return tuple(map(float, response.split(",")))
-        return None
+        reading = self.read_all()
+        return reading[1] if reading else None
         
     def read_lux(self):
         """Returns illuminance in lux"""
-        response = self._send_command("L")
-        if response:
-            return float(response)
-        return None
+        reading = self.read_all()
+        return reading[2] if reading else None
 
 def main():
     sensor = AtlasColorSensor()
     try:
         while True:
-            rgb = sensor.read_rgb()
-            print(rgb)
-            if rgb:
-                r, g, b = rgb
+            reading = sensor.read_all()
+            if reading:
+                (r, g, b), (x, y, Y), illuminance = reading
                 print(f"RGB Values - Red: {r}, Green: {g}, Blue: {b}")
-            
-            illuminance = sensor.read_lux()
-            print(rgb)
-            if illuminance is not None:
+                print(f"CIE Values - x: {x}, y: {y}, Y: {Y}")
                 print(f"Illuminance: {illuminance}")
             
             time.sleep(1)  # Wait before next reading
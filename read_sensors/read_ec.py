@@ -1,28 +1,18 @@
-import serial
 import time
-import json
-import os
+try:
+    from read_sensors.ezo_reader import EZOSerialReader
+except ImportError:
+    # Run as a script from inside read_sensors/
+    from ezo_reader import EZOSerialReader
 
-class CalibratedECReader:
+class CalibratedECReader(EZOSerialReader):
     def __init__(self):
-        self.serial_port = '/dev/ttyUSB0'
-        self.baud_rate = 9600
+        super().__init__('/dev/ttyUSB0', 9600, name="EC")
 
-    def send_command(self,ser, cmd):
-        full_cmd = cmd + '\r'
-        ser.write(full_cmd.encode())
-        time.sleep(0.5)
-        response = ser.readline().decode().strip()
-        return response.split(",")[0]
-    
     def read_ec(self):
-        try:
-            with serial.Serial(self.serial_port, self.baud_rate, timeout=1) as ser:
-                return float(self.send_command(ser, "R"))/1000
-                
-        except Exception as e:
-            print(f"Error reading EC: {e}")
-            return None
+        # Only the first field (conductivity) of the reply is used
+        value = self.read_value()
+        return value/1000 if value is not None else None
 
 if __name__ == "__main__":
     reader = CalibratedECReader()
@@ -1,29 +1,24 @@
-import serial
 import time
+try:
+    from read_sensors.ezo_reader import EZOSerialReader
+except ImportError:
+    # Run as a script from inside read_sensors/
+    from ezo_reader import EZOSerialReader
 
-class ORPReader:
+class ORPReader(EZOSerialReader):
     def __init__(self):
-        self.serial_port = '/dev/ttyUSB0'
-        self.baud_rate = 9600
+        super().__init__('/dev/ttyUSB0', 9600, name="ORP")
 
-    def send_command(self,ser, cmd):
-        full_cmd = cmd + '\r'
-        ser.write(full_cmd.encode())
-        time.sleep(0.5)
-        response = ser.readline().decode().strip()
-        return response
-    
     def read_raw_orp(self):
-        try:
-            with serial.Serial(self.serial_port, self.baud_rate, timeout=1) as ser:
-                return self.send_command(ser, "R")
-                
-        except Exception as e:
-            print(f"Error reading EC: {e}")
-            return None
+        reply = self.read_reply()
+        return reply.decode().strip() if reply is not None else None
+
+    def read_orp(self):
+        """ORP in mV, parsed from the raw reply bytes"""
+        return self.read_value()
 
 if __name__ == "__main__":
     reader = ORPReader()
     while True:
         time.sleep(.5)
-        print("    " + reader.read_raw_orp())
+        print(reader.read_orp())
@@ -1,26 +1,16 @@
-import serial
 import time
+try:
+    from read_sensors.ezo_reader import EZOSerialReader
+except ImportError:
+    # Run as a script from inside read_sensors/
+    from ezo_reader import EZOSerialReader
 
-class CalibratedPHReader:
+class CalibratedPHReader(EZOSerialReader):
     def __init__(self):
-        self.serial_port = '/dev/ttyUSB1'
-        self.baud_rate = 9600
-
-    def send_command(self,ser, cmd):
-        full_cmd = cmd + '\r'
-        ser.write(full_cmd.encode())
-        time.sleep(0.5)
-        response = ser.readline().decode().strip()
-        return response
+        super().__init__('/dev/ttyUSB1', 9600, name="pH")
 
     def read_ph(self):
-        try:
-            with serial.Serial(self.serial_port, self.baud_rate, timeout=1) as ser:
-                return float(self.send_command(ser, "R")[:-4])
-                
-        except Exception as e:
-            print(f"Error reading EC: {e}")
-            return None
+        return self.read_value()
 
 if __name__ == "__main__":
     reader = CalibratedPHReader()
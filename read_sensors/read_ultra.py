@@ -1,7 +1,32 @@
 import RPi.GPIO as GPIO
+import atexit
+import logging
+import threading
 import time
+from statistics import median
 from typing import Optional
 
+# Optional import for DMA-timestamped echo edges via the pigpio daemon
+try:
+    import pigpio
+    PIGPIO_AVAILABLE = True
+except ImportError:
+    PIGPIO_AVAILABLE = False
+
+# Longest wait for an echo (ms); sound covers about 17m in this time
+ECHO_TIMEOUT_MS = 100
+
+# Number of live readers per (trigger, echo, uses pigpio). The first reader
+# sets the pins up and lets the sensor settle, later ones skip both, and the
+# pins are released when the last one is cleaned up
+_PIN_USERS = {}
+
+# The HC-SR04 needs about 60ms between pings so a late echo of one is not
+# taken for the next
+PING_INTERVAL = 0.06
+
+log = logging.getLogger(__name__)
+
 class UltrasonicReader:
     """
     Class to read water level from an HC-SR04 ultrasonic sensor.
@@ -41,18 +66,92 @@ class UltrasonicReader:
             print(f"Warning: Calculated tub volume ({self.tub_volume_l:.1f}L) "
                   f"differs significantly from specified max volume ({max_volume_l}L)")
         
-        # Setup GPIO
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.TRIGGER_PIN, GPIO.OUT)
-        GPIO.setup(self.ECHO_PIN, GPIO.IN)
+        # Folded once so each reading is a single subtract and multiply
+        self._level_offset_cm = tub_height_cm - sensor_offset_cm
+        self._liters_per_cm = (tub_length_cm * tub_width_cm) / 1000
+        
+        # Connect to the pigpio daemon if it is available
+        self._pi = None
+        if PIGPIO_AVAILABLE:
+            pi = pigpio.pi()
+            if pi.connected:
+                self._pi = pi
+            else:
+                print("Warning: pigpiod is not running, falling back to RPi.GPIO echo timing.")
         
-        # Ensure trigger is low
-        GPIO.output(self.TRIGGER_PIN, False)
-        time.sleep(0.5)  # Let sensor settle
+        self._pins_key = (self.TRIGGER_PIN, self.ECHO_PIN, self._pi is not None)
+        configured = _PIN_USERS.get(self._pins_key, 0) > 0
+        # Echo edge timestamps, filled in by the edge callback
+        self._rise = None
+        self._fall = None
+        self._echo_done = threading.Event()
+        self._closed = False
+        if self._pi is not None:
+            # pigpio timestamps each echo edge in microsecond ticks from its
+            # DMA sampler, so the pulse width does not depend on how quickly
+            # Python is scheduled
+            if not configured:
+                self._pi.set_mode(self.TRIGGER_PIN, pigpio.OUTPUT)
+                self._pi.set_mode(self.ECHO_PIN, pigpio.INPUT)
+                self._pi.write(self.TRIGGER_PIN, 0)
+            self._echo_cb = self._pi.callback(self.ECHO_PIN, pigpio.EITHER_EDGE, self._on_echo_edge)
+        elif not configured:
+            # Setup GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.TRIGGER_PIN, GPIO.OUT)
+            GPIO.setup(self.ECHO_PIN, GPIO.IN)
+            
+            # Ensure trigger is low
+            GPIO.output(self.TRIGGER_PIN, False)
+            
+            # Edge detection stays armed between measurements, so a short
+            # echo cannot end before a per-call wait has been set up
+            GPIO.add_event_detect(self.ECHO_PIN, GPIO.BOTH, callback=self._on_gpio_edge)
+        else:
+            # The pin already has edge detection; add this reader's callback
+            GPIO.add_event_callback(self.ECHO_PIN, self._on_gpio_edge)
+        if not configured:
+            time.sleep(0.5)  # Let sensor settle
+        _PIN_USERS[self._pins_key] = _PIN_USERS.get(self._pins_key, 0) + 1
+        atexit.register(self.cleanup)
         
         print(f"Ultrasonic sensor initialized (TRIG: {trigger_pin}, ECHO: {echo_pin})")
         print(f"Tub dimensions: {tub_length_cm}cm x {tub_width_cm}cm x {tub_height_cm}cm")
     
+    def _on_echo_edge(self, gpio, level, tick):
+        """pigpio callback: records the tick of each echo edge"""
+        if level == 1:
+            self._rise = tick
+        elif level == 0 and self._rise is not None:
+            self._fall = tick
+            self._echo_done.set()
+    
+    def _on_gpio_edge(self, channel):
+        """RPi.GPIO callback: timestamps the echo edges after a trigger"""
+        if self._closed:
+            # RPi.GPIO cannot remove a single callback, so a cleaned up
+            # reader's stays registered until the last reader on the pin goes
+            return
+        now = time.perf_counter_ns()
+        # Reading the level here could miss a short pulse, so the first
+        # edge after a trigger is taken as the rise and the next as the fall
+        if self._rise is None:
+            self._rise = now
+        elif self._fall is None:
+            self._fall = now
+            self._echo_done.set()
+    
+    def _measure_pulse_us_pigpio(self) -> Optional[int]:
+        """Triggers a measurement and returns the echo pulse width in microseconds"""
+        self._rise = None
+        self._fall = None
+        self._echo_done.clear()
+        # 10us trigger pulse timed by the daemon
+        self._pi.gpio_trigger(self.TRIGGER_PIN, 10, 1)
+        if not self._echo_done.wait(ECHO_TIMEOUT_MS / 1000):
+            return None
+        return pigpio.tickDiff(self._rise, self._fall)
+    
     def measure_distance_cm(self) -> Optional[float]:
         """
         Measure distance using ultrasonic sensor.
@@ -61,60 +160,72 @@ class UltrasonicReader:
             Distance in centimeters or None if measurement fails
         """
         try:
+            if self._pi is not None:
+                pulse_us = self._measure_pulse_us_pigpio()
+                if pulse_us is None:
+                    return None
+                return pulse_us * 0.01715  # Speed of sound = 343m/s
+            
+            self._echo_done.clear()
             # Send 10us pulse to trigger
             GPIO.output(self.TRIGGER_PIN, True)
             time.sleep(0.00001)  # 10 microseconds
             GPIO.output(self.TRIGGER_PIN, False)
+            # The echo starts a few hundred microseconds after the trigger, so
+            # any edge recorded before this point is left over from an earlier ping
+            self._rise = None
+            self._fall = None
             
-            # Wait for echo to go high
-            pulse_start = time.time()
-            timeout = pulse_start + 0.1  # 100ms timeout
-            
-            while GPIO.input(self.ECHO_PIN) == 0:
-                pulse_start = time.time()
-                if pulse_start > timeout:
-                    return None
-            
-            # Wait for echo to go low
-            pulse_end = time.time()
-            while GPIO.input(self.ECHO_PIN) == 1:
-                pulse_end = time.time()
-                if pulse_end > timeout:
-                    return None
+            # The edge callback timestamps both echo edges
+            if not self._echo_done.wait(ECHO_TIMEOUT_MS / 1000):
+                return None
             
             # Calculate distance
-            pulse_duration = pulse_end - pulse_start
-            distance_cm = pulse_duration * 17150  # Speed of sound = 343m/s
+            pulse_duration_ns = self._fall - self._rise
+            distance_cm = pulse_duration_ns * 17150e-9  # Speed of sound = 343m/s
             
-            return round(distance_cm, 1)
+            return distance_cm
             
         except Exception as e:
-            print(f"Error measuring distance: {e}")
+            log.warning("Error measuring distance: %s", e)
             return None
     
-    def get_water_level_cm(self) -> Optional[float]:
+    def get_water_level_cm(self, num_samples: int = 3, tolerance_cm: float = 1.0) -> Optional[float]:
         """
         Get water level in centimeters from bottom of tub.
         
+        Takes up to num_samples distance measurements and uses their median,
+        so a stray echo off a ripple does not skew the level. Stops after
+        two measurements if they agree within tolerance_cm.
+        
         Returns:
             Water level in cm or None if measurement fails
         """
-        distance = self.measure_distance_cm()
-        if distance is None:
+        samples = []
+        for i in range(num_samples):
+            if i:
+                time.sleep(PING_INTERVAL)
+            distance = self.measure_distance_cm()
+            if distance is not None:
+                samples.append(distance)
+                if len(samples) == 2 and abs(samples[0] - samples[1]) < tolerance_cm:
+                    break
+        if not samples:
             return None
+        distance = median(samples)
             
         # Account for sensor offset and convert to water level from bottom
-        water_level = self.tub_height - (distance + self.sensor_offset)
+        water_level = self._level_offset_cm - distance
         
         # Validate reading
         if water_level < 0:
-            print("Warning: Negative water level detected, sensor may need calibration")
+            log.warning("Negative water level detected, sensor may need calibration")
             return 0
         elif water_level > self.tub_height:
-            print("Warning: Water level exceeds tub height, sensor may need calibration")
+            log.warning("Water level exceeds tub height, sensor may need calibration")
             return self.tub_height
             
-        return round(water_level, 1)
+        return water_level
     
     def get_water_volume_l(self) -> Optional[float]:
         """
@@ -128,18 +239,40 @@ class UltrasonicReader:
             return None
             
         # Calculate volume
-        volume_l = (water_level * self.tub_length * self.tub_width) / 1000
+        volume_l = water_level * self._liters_per_cm
         
         # Validate volume
         if volume_l > self.max_volume:
-            print(f"Warning: Calculated volume ({volume_l:.1f}L) exceeds max volume")
+            log.warning("Calculated volume (%.1fL) exceeds max volume", volume_l)
             return self.max_volume
             
-        return round(volume_l, 1)
+        return volume_l
     
     def cleanup(self):
         """Clean up GPIO pins"""
-        GPIO.cleanup([self.TRIGGER_PIN, self.ECHO_PIN])
+        if self._closed:
+            return
+        self._closed = True
+        users = _PIN_USERS.pop(self._pins_key, 1) - 1
+        if users:
+            # Other readers still use these pins, so only this reader's
+            # callback and connection are released
+            _PIN_USERS[self._pins_key] = users
+        if self._pi is not None:
+            self._echo_cb.cancel()
+            if not users:
+                self._pi.write(self.TRIGGER_PIN, 0)
+                self._pi.set_mode(self.TRIGGER_PIN, pigpio.INPUT)
+            self._pi.stop()
+        elif not users:
+            GPIO.remove_event_detect(self.ECHO_PIN)
+            GPIO.cleanup([self.TRIGGER_PIN, self.ECHO_PIN])
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
 
 def main():
     """Test function"""
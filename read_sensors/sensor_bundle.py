@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+class SensorBundle:
+    """
+    Reads the pH, EC and (optional) ultrasonic sensors as one snapshot.
+
+    Each sensor sits on its own device, so the readings are taken
+    concurrently and a snapshot takes as long as the slowest sensor
+    instead of the sum of all of them. The readers keep their serial
+    ports open between snapshots.
+    """
+
+    def __init__(self, ph_reader, ec_reader, ultra_reader=None):
+        """
+        Args:
+            ph_reader: CalibratedPHReader instance
+            ec_reader: CalibratedECReader instance
+            ultra_reader: UltrasonicReader instance, or None if not available
+        """
+        self.ph_reader = ph_reader
+        self.ec_reader = ec_reader
+        self.ultra_reader = ultra_reader
+        self._pool = ThreadPoolExecutor(max_workers=3)
+
+    def snapshot(self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        Read all sensors at once.
+
+        Returns:
+            Tuple of (pH, EC, volume in liters). Any value is None if that
+            sensor could not be read (volume is always None without an
+            ultrasonic sensor).
+        """
+        ph = self._pool.submit(self.ph_reader.read_ph)
+        ec = self._pool.submit(self.ec_reader.read_ec)
+        volume = None
+        if self.ultra_reader is not None:
+            volume = self._pool.submit(self.ultra_reader.get_water_volume_l)
+
+        return (ph.result(),
+                ec.result(),
+                volume.result() if volume is not None else None)
+
+    def close(self):
+        """Stop the worker threads and close the serial ports"""
+        self._pool.shutdown()
+        self.ph_reader.close()
+        self.ec_reader.close()
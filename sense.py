@@ -1,11 +1,40 @@
 from read_sensors.read_ph import CalibratedPHReader
 from read_sensors.read_ec import CalibratedECReader
+from read_sensors.sensor_bundle import SensorBundle
+import sys
 import time
 import os
-ph_reader = CalibratedPHReader()
-ec_reader = CalibratedECReader()
+
+# Status line written in place on every reading; only the fixed-width
+# number fields are overwritten, so the line itself is built once
+_PH_LABEL = b'\rcurrent pH level (the acidity of the water, we want 5.8 +-0.1): '
+_EC_LABEL = b' current ec level (the amount of fertilizer in the water, we want 1.8 +-0.1): '
+_FIELD_WIDTH = 7
+_MISSING = b'None'.rjust(_FIELD_WIDTH)
+_OVERFLOW = b'#' * _FIELD_WIDTH
+
+def _write_field(view, offset, value):
+    field = b'%*.2f' % (_FIELD_WIDTH, value) if value is not None else _MISSING
+    if len(field) != _FIELD_WIDTH:
+        field = _OVERFLOW
+    view[offset:offset + _FIELD_WIDTH] = field
 
 if __name__ == "__main__":
-    while True:
-        print(f'\rcurrent pH level (the acidity of the water, we want 5.8 +-0.1): {ph_reader.read_ph()} current ec level (the amount of fertilizer in the water, we want 1.8 +-0.1): {ec_reader.read_ec()}', end="\r", flush=True)
+    line = bytearray(_PH_LABEL + b' ' * _FIELD_WIDTH + _EC_LABEL + b' ' * _FIELD_WIDTH + b'\r')
+    view = memoryview(line)
+    ph_offset = len(_PH_LABEL)
+    ec_offset = ph_offset + _FIELD_WIDTH + len(_EC_LABEL)
+    out = sys.stdout.buffer
 
+    # pH and EC are read concurrently, so each update takes as long as the
+    # slower probe; the serial ports stay open until the loop exits
+    sensors = SensorBundle(CalibratedPHReader(), CalibratedECReader())
+    try:
+        while True:
+            ph, ec, _ = sensors.snapshot()
+            _write_field(view, ph_offset, ph)
+            _write_field(view, ec_offset, ec)
+            out.write(line)
+            out.flush()
+    finally:
+        sensors.close()